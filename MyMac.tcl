@@ -1,6 +1,7 @@
-if { $argc != 1 } {
+if { $argc < 1 || $argc > 3 } {
     puts "The add.tcl script requires one number to be inputed - repeat times."
-    puts "For example, ns MyMac.tcl 5".
+    puts "A trace file name and a random seed can optionally follow it."
+    puts "For example, ns MyMac.tcl 5 or ns MyMac.tcl 5 run5.tr 3."
     puts "Please try again."
     exit(0)
 }
@@ -13,8 +14,18 @@ set val(repeatTx_)      [lindex $argv 0]
 set val(cbrInterval_)   0.02
 set val(dim)           50
 set val(trace_file)     jravicha.tr
+set val(seed)           10
 set val(node_size)      5
 
+# Optional trace file and seed, used when sweeping parameters
+if { $argc > 1 } {
+    set val(trace_file) [lindex $argv 1]
+}
+if { $argc > 2 } {
+    set val(seed) [lindex $argv 2]
+    $defaultRNG seed $val(seed)
+}
+
 # Parameters for setting up the simulation
 set val(chan)           Channel/WirelessChannel    ;
 set val(prop)           Propagation/TwoRayGround   ;
@@ -71,9 +82,9 @@ $ns initial_node_pos $sink_node $val(node_size)
 set sink [new Agent/LossMonitor]
 $ns attach-agent $sink_node $sink
 
-# Random number generator with seed 10
+# Random number generator, seed 10 unless given on the command line
 set rng [new RNG]
-$rng seed 10
+$rng seed $val(seed)
 
 # RNG for position
 set rand_loc [new RandomVariable/Uniform]
@@ -375,6 +375,8 @@ for line in output_lines:
                 info_to_add['free_pfn'] = match_format.group(5)
                 info_to_add['zone_end'] = match_format.group(6)
                 info_to_add['mode'] = match_format.group(7)
+                info_dict = get_info_dict_for_process(process_info)
+                info_dict[COMPACTION_ZONE_BEGIN] = info_to_add
 
         elif tracepoint_name == 'mm_compaction_zone_end':
             delay_status, time_elapsed = find_latency(process_info,
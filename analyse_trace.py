@@ -1,36 +1,147 @@
-def filter(trace_file):
-	# Open jravicha.tr
-	with open(trace_file, 'r') as f :
-		# Get the raw lines
-		raw_lines = f.read().split('\n')
-	traces = []
-	
-	# Iterate through every raw line and store only information we are interested in
-	for line in raw_lines :
-    		fields = line.split(' ')
-		
-		# Only send/ receive/drop event types
-    		if fields[0] not in ['s', 'r', 'D'] :
-      			continue
-		# Only from MAC layer
-    		if not (fields[3] == 'MAC') :
-      			continue
-		# Only of cbr traffic type
-    		if not (fields[7] == 'cbr') :
-      			continue
-		# Append data of interest to traces
-    		traces.append({'event': fields[0], 'node': fields[2], 'packet': int(fields[6])})
-
-	# Get the total number of packets sent
-	total_sent = len(set(t['packet'] for t in traces))
-	
-	# Number of packets received by sink
-	packets_received = len(set(t['packet'] for t in traces if t['node'] == '_0_' and t['event'] == 'r'))
-	
-	# Print results
-	print("total sent: %d, no of packets received by sink: %d, Percentage: %.2f%%" % (total_sent, packets_received, float(packets_received)/total_sent*100))
-  	return
-
-filter("jravicha.tr")
+# This script reads an ns-2 trace written by MyMac.tcl and shows how many cbr
+# packets were sent and how many of them reached the sink (node 0).
+# The trace is read line by line in a single pass and packet ids are kept in
+# compact arrays, so memory does not grow with the size of the trace file.
+# Usage: python analyse_trace.py [TRACE_FILE] [-w WINDOW] [-n]
+
+import argparse
+from array import array
+
+GROWTH = 4096
+
+# Node which all the cbr traffic is sent to
+SINK = 0
+
+# Indexes into the per-node counters
+SENT        = 0
+RECEIVED    = 1
+DROPPED     = 2
+
+EVENT_INDEX = {'s': SENT, 'r': RECEIVED, 'D': DROPPED}
+
+
+# Results of one trace
+class DeliveryStats(object):
+
+    def __init__(self, window):
+        self.window = window
+        self.total_sent = 0
+        self.packets_received = 0
+        # Window the packet was first seen in plus one, 0 if not seen yet
+        self.first_window = array('I')
+        # Bitmap of packets received by the sink
+        self.received = bytearray()
+        # [sent, received, dropped] per node
+        self.nodes = {}
+        # Packets first seen and packets received by the sink per window,
+        # receptions are counted in the window the packet was first seen in
+        self.window_sent = {}
+        self.window_received = {}
+
+    def add_packet(self, packet, time):
+        first_window = self.first_window
+        if packet >= len(first_window):
+            first_window.extend([0] * (packet - len(first_window) + GROWTH))
+        if not first_window[packet]:
+            window = int(time / self.window) if self.window else 0
+            first_window[packet] = window + 1
+            self.total_sent += 1
+            self.window_sent[window] = self.window_sent.get(window, 0) + 1
+
+    def add_received(self, packet):
+        index = packet >> 3
+        bit = 1 << (packet & 7)
+        received = self.received
+        if index >= len(received):
+            received.extend(bytearray(index - len(received) + GROWTH))
+        if not received[index] & bit:
+            received[index] |= bit
+            self.packets_received += 1
+            window = self.first_window[packet] - 1
+            self.window_received[window] = \
+                self.window_received.get(window, 0) + 1
+
+    def delivery_ratio(self):
+        if not self.total_sent:
+            return 0.0
+        return float(self.packets_received) / self.total_sent
+
+    def windows(self):
+        for window in sorted(self.window_sent):
+            sent = self.window_sent[window]
+            received = self.window_received.get(window, 0)
+            yield (window * self.window, sent, received,
+                   float(received) / sent)
+
+
+# Reads trace lines and returns a DeliveryStats. With window set packets are
+# also grouped into windows of that many seconds of simulation time.
+def delivery_stats(lines, window=None):
+    stats = DeliveryStats(window)
+    nodes = stats.nodes
+    for line in lines:
+        # Only send/ receive/drop event types
+        event = EVENT_INDEX.get(line[:1])
+        if event is None:
+            continue
+        # Fields after the packet type are never needed
+        fields = line.split(' ', 8)
+        if len(fields) < 8:
+            continue
+        # Only from MAC layer and of cbr traffic type
+        if fields[3] != 'MAC' or fields[7] != 'cbr':
+            continue
+        node = int(fields[2].strip('_'))
+        packet = int(fields[6])
+        counts = nodes.get(node)
+        if counts is None:
+            counts = nodes[node] = [0, 0, 0]
+        counts[event] += 1
+        stats.add_packet(packet, float(fields[1]))
+        if event == RECEIVED and node == SINK:
+            stats.add_received(packet)
+    return stats
+
+
+# Prints the packet delivery of a trace file
+def filter(trace_file, window=None, show_nodes=False):
+    with open(trace_file, 'r') as f:
+        stats = delivery_stats(f, window)
+
+    # Print results
+    print("total sent: %d, no of packets received by sink: %d, Percentage: %.2f%%" % (stats.total_sent, stats.packets_received, stats.delivery_ratio()*100))
+
+    if show_nodes:
+        print('\n%6s %10s %10s %10s' % ('node', 'sent', 'received',
+                                         'dropped'))
+        for node in sorted(stats.nodes):
+            counts = stats.nodes[node]
+            print('%6d %10d %10d %10d' % (node, counts[SENT],
+                                          counts[RECEIVED], counts[DROPPED]))
+
+    if window:
+        print('\n%10s %10s %10s %10s' % ('time (s)', 'sent', 'received',
+                                         'ratio'))
+        for start, sent, received, ratio in stats.windows():
+            print('%10g %10d %10d %9.2f%%' % (start, sent, received,
+                                              ratio*100))
+    return stats
+
+
+if __name__ == '__main__':
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Packet delivery analyzer '
+                                                 'for ns-2 traces')
+    parser.add_argument('trace_file', nargs='?', default='jravicha.tr',
+                        help='Trace file written by MyMac.tcl')
+    parser.add_argument('-w', '--window', action='store', default=None,
+                        dest='window', type=float,
+                        help='Show delivery ratio per WINDOW seconds')
+    parser.add_argument('-n', '--nodes', action='store_true',
+                        dest='show_nodes',
+                        help='Show sent/received/dropped counts per node')
+    args = parser.parse_args()
+
+    filter(args.trace_file, args.window, args.show_nodes)
 
 # Reference - http://jhshi.me/2013/12/15/simulate-random-mac-protocol-in-ns2-part-iv/index.html
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# Shows how much work the compaction scanners do for each compact_zone call.
+# mm_compaction_zone_begin and mm_compaction_zone_end carry the migrate and
+# free scanner positions, the difference between the two gives the pfns
+# scanned by each scanner, whether the scanners met and the time spent per
+# scanned pfn. Results are aggregated by node/zone and mode and by the rc and
+# contended values of the try_to_compact_pages call around them, to tell
+# long compactions that scan a lot for nothing from ones that hit contention.
+# Usage: python3 compaction_scanners.py -s PATH/TO/TRACE_PIPE -t THRESHOLD
+# Invocations longer than THRESHOLD ms are printed as they end, the
+# aggregates are printed at EOF or when CTRL+C is pressed.
+
+import argparse
+import sys
+
+from collections import defaultdict
+
+import symbols
+import tracepoints
+from trace_collector import Collector
+
+
+# Returns a pfn field (printed as 0x%lx by the kernel) as an integer
+def parse_pfn(raw_pfn):
+    return int(raw_pfn, 16)
+
+
+# Running totals for a group of compact_zone invocations
+class ScannerStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.migrate_scanned = 0
+        self.free_scanned = 0
+        self.converged = 0
+        self.status = defaultdict(int)
+
+    def add(self, invocation):
+        self.count += 1
+        self.time += invocation['time']
+        if invocation['time'] > self.max_time:
+            self.max_time = invocation['time']
+        self.migrate_scanned += invocation['migrate_scanned']
+        self.free_scanned += invocation['free_scanned']
+        if invocation['converged']:
+            self.converged += 1
+        self.status[invocation['status']] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.time += other.time
+        if other.max_time > self.max_time:
+            self.max_time = other.max_time
+        self.migrate_scanned += other.migrate_scanned
+        self.free_scanned += other.free_scanned
+        self.converged += other.converged
+        for status, count in other.status.items():
+            self.status[status] += count
+
+    # Average time in nanoseconds spent per scanned pfn
+    def ns_per_pfn(self):
+        scanned = self.migrate_scanned + self.free_scanned
+        if not scanned:
+            return None
+        return self.time * 1000000 / scanned
+
+
+class CompactionScanners(object):
+
+    def __init__(self):
+        # Open compact_zone and try_to_compact_pages calls per task
+        self.zone_begin = {}
+        self.compaction = {}
+        # Aggregates by (nid, zid, mode) and by (rc, contended)
+        self.by_zone = defaultdict(ScannerStats)
+        self.by_result = defaultdict(ScannerStats)
+        self.compactions_by_result = defaultdict(int)
+        self.trace_match = symbols.by_tracepoint_id({
+            'mm_compaction_try_to_compact_pages_begin': self.compaction_b,
+            'mm_compaction_try_to_compact_pages_end':   self.compaction_e,
+            'mm_compaction_zone_begin':                 self.compaction_zone_b,
+            'mm_compaction_zone_end':                   self.compaction_zone_e})
+
+    # Feeds one TraceEvent, returns the finished invocation dictionary for
+    # mm_compaction_zone_end and None for anything else
+    def update(self, event):
+        handler = self.trace_match.get(event.tracepoint)
+        if handler:
+            return handler(event)
+        return None
+
+    def compaction_b(self, event):
+        # Zone compactions until the matching end are attributed to this call
+        self.compaction[event.task] = ScannerStats()
+
+    def compaction_e(self, event):
+        zones = self.compaction.pop(event.task, None)
+        match_format = tracepoints.compact_end_pattern.match(event.info)
+        if zones is None or not match_format:
+            return None
+        key = (match_format.group(1), int(match_format.group(2)))
+        self.compactions_by_result[key] += 1
+        self.by_result[key].merge(zones)
+        return None
+
+    def compaction_zone_b(self, event):
+        match_format = tracepoints.compact_zone_begin_pattern.match(event.info)
+        if match_format:
+            self.zone_begin[event.task] = (
+                event.timestamp,
+                int(match_format.group(1)),
+                int(match_format.group(2)),
+                parse_pfn(match_format.group(4)),
+                parse_pfn(match_format.group(5)),
+                match_format.group(7))
+        return None
+
+    def compaction_zone_e(self, event):
+        begin = self.zone_begin.pop(event.task, None)
+        match_format = tracepoints.compact_zone_end_pattern.match(event.info)
+        if begin is None or not match_format:
+            return None
+        begin_time, nid, zid, begin_migrate_pfn, begin_free_pfn, mode = begin
+        migrate_pfn = parse_pfn(match_format.group(2))
+        free_pfn = parse_pfn(match_format.group(3))
+        # The migrate scanner moves up from the zone start and the free
+        # scanner moves down from the zone end until they meet
+        invocation = {
+            'nid': nid,
+            'zid': zid,
+            'mode': mode,
+            'status': match_format.group(6),
+            'time': round(event.timestamp - begin_time, 3),
+            'migrate_scanned': max(migrate_pfn - begin_migrate_pfn, 0),
+            'free_scanned': max(begin_free_pfn - free_pfn, 0),
+            'gap': max(free_pfn - migrate_pfn, 0),
+            'converged': migrate_pfn >= free_pfn}
+        self.by_zone[(nid, zid, mode)].add(invocation)
+        zones = self.compaction.get(event.task)
+        if zones is not None:
+            zones.add(invocation)
+        return invocation
+
+
+def print_invocation(process_info, invocation):
+    print('\n%s : zone compaction : time = %s ms' % (process_info,
+                                                     invocation['time']))
+    print('nid = %d zid = %d mode = %s status = %s' % (
+          invocation['nid'], invocation['zid'], invocation['mode'],
+          invocation['status']))
+    print('migrate scanned = %d free scanned = %d gap = %d converged = %s' % (
+          invocation['migrate_scanned'], invocation['free_scanned'],
+          invocation['gap'], invocation['converged']))
+
+
+# Prints one aggregate row
+def print_stats_row(label, stats):
+    ns_per_pfn = stats.ns_per_pfn()
+    print('%-28s %7d %11.3f %10.3f %12d %12d %9d %10s  %s' % (
+          label, stats.count, stats.time, stats.max_time,
+          stats.migrate_scanned, stats.free_scanned, stats.converged,
+          '-' if ns_per_pfn is None else '%.1f' % ns_per_pfn,
+          ' '.join('%s=%d' % (status, count)
+                   for status, count in sorted(stats.status.items()))))
+
+
+def print_stats_header(label):
+    print('\n%-28s %7s %11s %10s %12s %12s %9s %10s  %s' % (
+          label, 'calls', 'time (ms)', 'max (ms)', 'migrate pfn',
+          'free pfn', 'converged', 'ns/pfn', 'status'))
+
+
+def print_summary(compaction_scanners):
+    print_stats_header('nid/zid/mode')
+    for key in sorted(compaction_scanners.by_zone):
+        print_stats_row('%d/%d/%s' % key, compaction_scanners.by_zone[key])
+    print_stats_header('rc/contended')
+    for key in sorted(compaction_scanners.by_result):
+        print_stats_row('%s/%d (%d calls)' % (
+                        key[0], key[1],
+                        compaction_scanners.compactions_by_result[key]),
+                        compaction_scanners.by_result[key])
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Compaction scanner progress '
+                                                 'analyzer')
+    parser.add_argument('-s', '--source', action='append', default=[],
+                        dest='sources',
+                        help='Source to read tracepoints from, may be repeated')
+    parser.add_argument('-t', '--threshold', action='store', default=None,
+                        dest='threshold', type=float,
+                        help='Print zone compactions longer than THRESHOLD ms')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        dest='follow',
+                        help='Keep polling plain files for new data at EOF')
+    args = parser.parse_args()
+
+    sources = args.sources or ['/sys/kernel/debug/tracing/trace_pipe']
+    threshold = args.threshold
+
+    compaction_scanners = CompactionScanners()
+
+    def update_scanners(source_name, event):
+        invocation = compaction_scanners.update(event)
+        if (invocation and threshold is not None and
+                invocation['time'] > threshold):
+            print_invocation(symbols.tasks.name(event.task), invocation)
+
+    try:
+        Collector(sources, update_scanners, follow=args.follow).run()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        print('Cannot open source file: %s' % e)
+        sys.exit(1)
+
+    print_summary(compaction_scanners)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# Streaming input and output for compressed trace captures.
+# Compressed files are recognised by their magic bytes and decompressed in
+# large blocks on a background thread, so decompression overlaps with
+# parsing and the decompressed capture never has to be written to disk.
+# gzip, xz and bzip2 are supported out of the box, zstd needs the zstandard
+# module.
+
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import stat
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = 1 << 20
+DEFAULT_READ_AHEAD = 8
+
+# Magic bytes at the start of compressed files
+MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'BZh', 'bzip2'))
+
+# File name extensions for output files
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+    '.bz2': 'bzip2'}
+
+
+# Returns the compression format for the first bytes of a file or None
+def detect_compression(header):
+    for magic, compression in MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+# Returns the compression format of a regular file or None. FIFOs and
+# trace_pipe (which has size 0) are never treated as compressed since
+# peeking would consume data.
+def file_compression(path):
+    path_stat = os.stat(path)
+    if not stat.S_ISREG(path_stat.st_mode) or not path_stat.st_size:
+        return None
+    with open(path, 'rb') as f:
+        return detect_compression(f.read(6))
+
+
+def check_zstd():
+    if zstandard is None:
+        raise IOError('zstd compression needs the zstandard module')
+
+
+# Opens a binary decompressing stream of the given format, a plain file if
+# compression is None
+def open_decompressed(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    if compression == 'bzip2':
+        return bz2.open(path, 'rb')
+    if compression == 'zstd':
+        check_zstd()
+        f = open(path, 'rb')
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    return open(path, 'rb')
+
+
+# Reads blocks from a stream on a background thread. At most read_ahead
+# blocks are kept waiting, so the reading thread stops when the consumer
+# falls behind.
+class ThreadedReader(object):
+
+    def __init__(self, stream, block_size=BLOCK_SIZE,
+                 read_ahead=DEFAULT_READ_AHEAD):
+        self.stream = stream
+        self.block_size = block_size
+        self.blocks = queue.Queue(read_ahead)
+        self.eof = False
+        self.error = None
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.read_blocks)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def read_blocks(self):
+        try:
+            while not self.closed.is_set():
+                block = self.stream.read(self.block_size)
+                self.put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self.error = e
+            self.put(b'')
+
+    def put(self, block):
+        while not self.closed.is_set():
+            try:
+                self.blocks.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    # Returns the next block of decompressed data, b'' at EOF
+    def read_block(self):
+        if self.eof:
+            return b''
+        block = self.blocks.get()
+        if not block:
+            self.eof = True
+            if self.error is not None:
+                raise IOError(self.error)
+        return block
+
+    def close(self):
+        self.closed.set()
+        self.thread.join()
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Opens a capture for reading in blocks on a background thread, decompressing
+# it if it is compressed
+def open_capture(path, block_size=BLOCK_SIZE, read_ahead=DEFAULT_READ_AHEAD):
+    compression = file_compression(path)
+    return ThreadedReader(open_decompressed(path, compression), block_size,
+                          read_ahead)
+
+
+# Opens a binary output file, compressed according to compression or, if
+# that is not given, to the extension of path
+def open_output(path, compression=None, level=None):
+    if compression is None:
+        compression = EXTENSIONS.get(os.path.splitext(path)[1])
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', 6 if level is None else level)
+    if compression == 'xz':
+        return lzma.open(path, 'wb', preset=level)
+    if compression == 'bzip2':
+        return bz2.open(path, 'wb', 9 if level is None else level)
+    if compression == 'zstd':
+        check_zstd()
+        f = open(path, 'wb')
+        compressor = zstandard.ZstdCompressor(level=3 if level is None
+                                              else level)
+        return compressor.stream_writer(f, closefd=True)
+    if compression is not None:
+        raise ValueError('unknown compression %r' % compression)
+    return open(path, 'wb')
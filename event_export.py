@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# Exports completed begin/end pairs of reclaim and compaction tracepoints as
+# typed columns, so that notebooks can load millions of events without
+# parsing text output.
+# Every row is one pair: pid, comm id, cpu, start timestamp and duration in
+# ms, event type, shrinker and the numeric fields of the begin and end
+# events. Fields an event does not have are null in Parquet. In the npy
+# output they are stored as the value in MISSING, -1 for ids and the
+# smallest int64 for numeric fields, which can be negative, and load_npy()
+# returns these columns as masked arrays. comm and shrinker are ids
+# from the symbol tables in symbols.py, the other strings (gfp_mask, mode,
+# rc, status) are ids into a small string table. All tables are written to
+# dictionary.json.
+# mm_shrink_slab_start/end are parsed with their own regexes, their counters
+# go to the shrinker columns (objects_to_shrink to retval).
+# Rows are written in row groups of BATCH_SIZE rows, either as one NumPy .npy
+# file per column in part-NNNNN/ directories (no dependencies needed) or as
+# row groups of a Parquet file if pyarrow is installed.
+# Usage: python3 event_export.py -s PATH/TO/TRACE_PIPE -o OUTPUT_DIR
+#                                [-F npy|parquet] [-b BATCH_SIZE]
+# Load the npy output with load_npy(OUTPUT_DIR), which needs numpy.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import struct
+import sys
+
+from array import array
+
+import symbols
+import tracepoints
+from trace_collector import Collector
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_BATCH_SIZE = 65536
+
+# Begin and end tracepoints of every event type
+EVENT_TYPES = (
+    ('slowpath', 'mm_slowpath_begin', 'mm_slowpath_end'),
+    ('direct_reclaim', 'mm_vmscan_direct_reclaim_begin',
+     'mm_vmscan_direct_reclaim_end'),
+    ('shrink_zones', 'mm_vmscan_shrink_zones_begin',
+     'mm_vmscan_shrink_zones_end'),
+    ('softlimit_reclaim', 'mm_vmscan_softlimit_reclaim_start',
+     'mm_vmscan_softlimit_reclaim_end'),
+    ('shrink_zone', 'mm_vmscan_shrink_zone_begin',
+     'mm_vmscan_shrink_zone_end'),
+    ('shrink_zone_memcg', 'mm_vmscan_shrink_zone_memcg_begin',
+     'mm_vmscan_shrink_zone_memcg_end'),
+    ('shrink_list', 'mm_vmscan_shrink_list_begin',
+     'mm_vmscan_shrink_list_end'),
+    ('shrink_slab_caches', 'mm_vmscan_shrink_slab_caches_begin',
+     'mm_vmscan_shrink_slab_caches_end'),
+    ('vmscan_shrink_slab', 'mm_vmscan_shrink_slab_start',
+     'mm_vmscan_shrink_slab_end'),
+    ('shrink_slab', 'mm_shrink_slab_start', 'mm_shrink_slab_end'),
+    ('compaction', 'mm_compaction_try_to_compact_pages_begin',
+     'mm_compaction_try_to_compact_pages_end'),
+    ('compaction_zone', 'mm_compaction_zone_begin',
+     'mm_compaction_zone_end'))
+
+# Tracepoint id to (event type, is begin)
+TRACEPOINTS = {}
+for event_type, (_, begin_name, end_name) in enumerate(EVENT_TYPES):
+    TRACEPOINTS[symbols.tracepoints.id(begin_name)] = (event_type, True)
+    TRACEPOINTS[symbols.tracepoints.id(end_name)] = (event_type, False)
+
+SHRINK_SLAB = [event[0] for event in EVENT_TYPES].index('shrink_slab')
+
+# Numeric fields exported. Fields present in both the begin and the end
+# event keep the end value, the begin value of the scanner positions is
+# kept in the _begin columns.
+NUMERIC_FIELDS = ('order', 'priority', 'nid', 'zid', 'lru', 'nr_to_scan',
+                  'nr_scanned', 'total_scanned', 'nr_reclaimed',
+                  'nr_to_reclaim', 'freed', 'contended', 'zone_start',
+                  'zone_end', 'migrate_pfn', 'free_pfn', 'objects_to_shrink',
+                  'pgs_scanned', 'lru_pgs', 'cache_items', 'delta',
+                  'total_scan', 'unused_scan', 'new_scan', 'retval')
+BEGIN_FIELDS = ('migrate_pfn', 'free_pfn', 'total_scan')
+STRING_FIELDS = ('gfp_mask', 'mode', 'rc', 'status')
+
+# Field names of the groups of the shrink_slab regexes, None is skipped
+SHRINK_SLAB_BEGIN_GROUPS = (None, None, 'nid', 'objects_to_shrink',
+                            'gfp_mask', 'pgs_scanned', 'lru_pgs',
+                            'cache_items', 'delta', 'total_scan')
+SHRINK_SLAB_END_GROUPS = (None, None, 'nid', 'unused_scan', 'new_scan',
+                          'total_scan', 'retval')
+
+# Names the same field has in different tracepoints
+FIELD_ALIASES = {'gfp_flags': 'gfp_mask'}
+
+# Column names and array typecodes with the matching NumPy dtypes
+COLUMNS = ([('pid', 'i'), ('comm', 'i'), ('cpu', 'h'), ('start', 'd'),
+            ('duration', 'd'), ('event', 'B'), ('shrinker', 'i')] +
+           [(name, 'q') for name in NUMERIC_FIELDS] +
+           [(name + '_begin', 'q') for name in BEGIN_FIELDS] +
+           [(name, 'i') for name in STRING_FIELDS])
+# Columns that can be missing and the value stored for a missing field
+MISSING_ID = -1
+MISSING_NUMBER = -2 ** 63
+MISSING = dict([('shrinker', MISSING_ID)] +
+               [(name, MISSING_NUMBER) for name in NUMERIC_FIELDS] +
+               [(name + '_begin', MISSING_NUMBER) for name in BEGIN_FIELDS] +
+               [(name, MISSING_ID) for name in STRING_FIELDS])
+DTYPES = {'i': 'i4', 'h': 'i2', 'd': 'f8', 'B': 'u1', 'q': 'i8'}
+ARROW_TYPES = {'i': 'int32', 'h': 'int16', 'd': 'float64', 'B': 'uint8',
+               'q': 'int64'}
+
+# Regex for key=value and key:value pairs in trace information
+field_pattern = re.compile(r'(\w+)[=:]\s*([^\s,]+)')
+
+
+# Returns the numeric value of a field or None
+def parse_number(raw_value):
+    try:
+        return int(raw_value, 0)
+    except ValueError:
+        try:
+            return int(raw_value)
+        except ValueError:
+            return None
+
+
+# Returns the fields of trace information as a dictionary
+def parse_fields(trace_info):
+    fields = {}
+    for name, value in field_pattern.findall(trace_info):
+        fields[FIELD_ALIASES.get(name, name)] = value
+    return fields
+
+
+# Returns the fields of trace information matched by a tracepoint regex
+def match_fields(pattern, groups, trace_info):
+    fields = {}
+    match_format = pattern.match(trace_info)
+    if match_format:
+        for name, value in zip(groups, match_format.groups()):
+            if name:
+                fields[name] = value
+    return fields
+
+
+# Removes the parts and Parquet file of an earlier export, which load_npy()
+# would otherwise read together with the new rows
+def remove_output(directory):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith('part-') and os.path.isdir(path):
+            shutil.rmtree(path)
+        elif name == 'events.parquet':
+            os.remove(path)
+
+
+# Collects rows in typed column arrays and writes them in row groups
+class ColumnWriter(object):
+
+    def __init__(self, directory, batch_size=DEFAULT_BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.strings = symbols.SymbolTable()
+        self.rows = 0
+        self.batches = 0
+        if os.path.isdir(directory):
+            remove_output(directory)
+        else:
+            os.makedirs(directory)
+        self.new_batch()
+
+    def new_batch(self):
+        self.columns = [array(typecode) for _, typecode in COLUMNS]
+        self.batch_rows = 0
+
+    def add_row(self, values):
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.batch_rows += 1
+        self.rows += 1
+        if self.batch_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch_rows:
+            self.write_batch()
+            self.batches += 1
+        self.new_batch()
+
+    def close(self):
+        self.flush()
+        with open(os.path.join(self.directory, 'dictionary.json'), 'w') as f:
+            json.dump({'comms': symbols.comms.names,
+                       'shrinkers': symbols.shrinkers.names,
+                       'strings': self.strings.names,
+                       'events': [event[0] for event in EVENT_TYPES],
+                       'columns': [name for name, _ in COLUMNS],
+                       'missing': MISSING,
+                       'rows': self.rows}, f)
+
+
+# Writes every row group as a directory with one .npy file per column
+class NpyWriter(ColumnWriter):
+
+    def write_batch(self):
+        part = os.path.join(self.directory, 'part-%05d' % self.batches)
+        if not os.path.isdir(part):
+            os.makedirs(part)
+        for (name, typecode), column in zip(COLUMNS, self.columns):
+            write_npy(os.path.join(part, name + '.npy'), column,
+                      DTYPES[typecode])
+
+
+# Writes all rows into one Parquet file, one row group per batch
+class ParquetWriter(ColumnWriter):
+
+    def __init__(self, directory, batch_size=DEFAULT_BATCH_SIZE):
+        if pyarrow is None:
+            raise IOError('Parquet output needs the pyarrow module')
+        self.writer = None
+        ColumnWriter.__init__(self, directory, batch_size)
+
+    def write_batch(self):
+        # The column arrays are handed to Arrow without copying, missing
+        # values become nulls through a validity bitmap
+        arrays = {}
+        for (name, typecode), column in zip(COLUMNS, self.columns):
+            arrow_type = pyarrow.type_for_alias(ARROW_TYPES[typecode])
+            data = pyarrow.py_buffer(column)
+            validity = None
+            if name in MISSING:
+                values = pyarrow.Array.from_buffers(arrow_type, len(column),
+                                                    [None, data])
+                validity = pyarrow.compute.not_equal(
+                    values, pyarrow.scalar(MISSING[name], arrow_type))
+                validity = validity.buffers()[1]
+            arrays[name] = pyarrow.Array.from_buffers(arrow_type, len(column),
+                                                      [validity, data])
+        table = pyarrow.table(arrays)
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(
+                os.path.join(self.directory, 'events.parquet'), table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        ColumnWriter.close(self)
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Writes an array as a version 1.0 .npy file
+def write_npy(path, column, dtype):
+    byteorder = '<' if sys.byteorder == 'little' else '>'
+    if dtype == 'u1':
+        byteorder = '|'
+    header = "{'descr': '%s%s', 'fortran_order': False, 'shape': (%d,), }" % (
+             byteorder, dtype, len(column))
+    # Data starts at a multiple of 64 bytes after the 10 byte preamble
+    header += ' ' * (63 - (10 + len(header)) % 64) + '\n'
+    with open(path, 'wb') as f:
+        f.write(b'\x93NUMPY\x01\x00')
+        f.write(struct.pack('<H', len(header)))
+        f.write(header.encode('latin1'))
+        column.tofile(f)
+
+
+# Loads the npy output of a directory as a dictionary of NumPy arrays,
+# columns that can be missing are masked arrays
+def load_npy(directory):
+    import numpy
+    parts = sorted(part for part in os.listdir(directory)
+                   if part.startswith('part-'))
+    columns = {}
+    for name, _ in COLUMNS:
+        columns[name] = numpy.concatenate([
+            numpy.load(os.path.join(directory, part, name + '.npy'))
+            for part in parts]) if parts else numpy.array([])
+        if name in MISSING:
+            columns[name] = numpy.ma.masked_equal(columns[name],
+                                                  MISSING[name])
+    with open(os.path.join(directory, 'dictionary.json')) as f:
+        dictionary = json.load(f)
+    return columns, dictionary
+
+
+# Pairs begin and end tracepoints per task and adds a row for every pair
+class EventExporter(object):
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.open_events = {}
+
+    def update(self, event):
+        tracepoint = TRACEPOINTS.get(event.tracepoint)
+        if tracepoint is None:
+            return
+        event_type, is_begin = tracepoint
+        key = (event.task, event_type)
+        if is_begin:
+            self.open_events[key] = event
+            return
+        begin = self.open_events.pop(key, None)
+        if begin is not None:
+            self.writer.add_row(self.row(event_type, begin, event))
+
+    def row(self, event_type, begin, end):
+        strings = self.writer.strings
+        if event_type == SHRINK_SLAB:
+            begin_fields = match_fields(tracepoints.shrink_slab_begin_pattern,
+                                        SHRINK_SLAB_BEGIN_GROUPS, begin.info)
+            end_fields = match_fields(tracepoints.shrink_slab_end_pattern,
+                                      SHRINK_SLAB_END_GROUPS, end.info)
+        else:
+            begin_fields = parse_fields(begin.info)
+            end_fields = parse_fields(end.info)
+        fields = begin_fields.copy()
+        fields.update(end_fields)
+        values = [symbols.tasks.pid(begin.task), symbols.tasks.comm(begin.task),
+                  begin.cpu, begin.timestamp,
+                  round(end.timestamp - begin.timestamp, 3), event_type,
+                  MISSING_ID if begin.shrinker is None else begin.shrinker]
+        for name in NUMERIC_FIELDS:
+            value = parse_number(fields[name]) if name in fields else None
+            values.append(MISSING_NUMBER if value is None else value)
+        for name in BEGIN_FIELDS:
+            value = parse_number(begin_fields[name]) \
+                if name in begin_fields else None
+            values.append(MISSING_NUMBER if value is None else value)
+        for name in STRING_FIELDS:
+            values.append(strings.id(fields[name]) if name in fields
+                          else MISSING_ID)
+        return values
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Columnar export of '
+                                                 'tracepoint pairs')
+    parser.add_argument('-s', '--source', action='append', default=[],
+                        dest='sources',
+                        help='Source to read tracepoints from, may be repeated')
+    parser.add_argument('-o', '--output', action='store', required=True,
+                        dest='output_dir', help='Directory to write to')
+    parser.add_argument('-F', '--format', action='store', default='npy',
+                        choices=('npy', 'parquet'), dest='output_format')
+    parser.add_argument('-b', '--batch-size', action='store', type=int,
+                        default=DEFAULT_BATCH_SIZE, dest='batch_size',
+                        help='Number of rows per row group')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        dest='follow',
+                        help='Keep polling plain files for new data at EOF')
+    args = parser.parse_args()
+
+    sources = args.sources or ['/sys/kernel/debug/tracing/trace_pipe']
+
+    try:
+        if args.output_format == 'parquet':
+            writer = ParquetWriter(args.output_dir, args.batch_size)
+        else:
+            writer = NpyWriter(args.output_dir, args.batch_size)
+    except IOError as e:
+        print('Cannot write output: %s' % e)
+        sys.exit(1)
+    exporter = EventExporter(writer)
+
+    def export_event(source_name, event):
+        exporter.update(event)
+
+    try:
+        Collector(sources, export_event, follow=args.follow).run()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        print('Cannot open source file: %s' % e)
+        sys.exit(1)
+    finally:
+        writer.close()
+
+    print('%d events written in %d row groups to %s' % (
+          writer.rows, writer.batches, args.output_dir))
+
+
+if __name__ == '__main__':
+    main()
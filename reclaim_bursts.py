@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# Keeps sliding window statistics of direct reclaim and compaction over trace
+# time and reports bursts, i.e. windows in which many tasks stall at once.
+# Every window is updated incrementally: new events are appended and events
+# that fell out of the window are dropped from the front, so an update costs
+# amortized O(1) regardless of the window length.
+# Usage: python3 reclaim_bursts.py -s PATH/TO/TRACE_PIPE
+#                                  -b 1s:reclaim_entries=20 -b 60s:stall_ms=5000
+# Metrics:
+#   reclaim_entries, compaction_entries  tasks entering direct reclaim or
+#                                        compaction in the window
+#   reclaim_tasks, compaction_tasks      peak number of tasks in direct
+#                                        reclaim or compaction at the same time
+#   stall_ms                             time spent in direct reclaim and
+#                                        compaction that ended in the window
+#   nr_reclaimed                         pages reclaimed by direct reclaim
+#   rc_<result>, status_<result>         compaction outcomes reported by
+#                                        try_to_compact_pages and compact_zone
+
+import argparse
+import re
+import sys
+
+from collections import defaultdict, deque
+
+import symbols
+import tracepoints
+from trace_collector import Collector
+
+DEFAULT_WINDOWS = (1000.0, 60000.0)
+
+# Regex for burst detector specification, e.g. 1s:reclaim_entries=20
+detector_pattern = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m):(\w+)=(\d+(?:\.\d+)?)$')
+
+WINDOW_UNITS = {'ms': 1.0, 's': 1000.0, 'm': 60000.0}
+
+# Metrics a burst detector can watch, see the list above
+METRICS = ('reclaim_entries', 'compaction_entries', 'reclaim_tasks',
+           'compaction_tasks', 'stall_ms', 'nr_reclaimed')
+METRIC_PREFIXES = ('rc_', 'status_')
+
+
+# Sums of counters and peaks of levels over the last length_ms of trace time
+class SlidingWindow(object):
+
+    def __init__(self, length_ms):
+        self.length = length_ms
+        self.entries = deque()
+        self.sums = defaultdict(float)
+        self.peaks = {}
+        self.levels = {}
+
+    # Adds value to counter name at timestamp
+    def add(self, timestamp, name, value=1):
+        self.entries.append((timestamp, name, value))
+        self.sums[name] += value
+
+    # Records that level name was at value at timestamp. Pass the highest
+    # value the level had around the change, so that the level in effect
+    # at the start of the window is accounted for by the first sample in it.
+    def sample(self, timestamp, name, value, current):
+        samples = self.peaks.get(name)
+        if samples is None:
+            samples = self.peaks[name] = deque()
+        # Keep the samples in decreasing order of value, a sample can never
+        # be the peak while a later sample with a larger value is in window
+        while samples and samples[-1][1] <= value:
+            samples.pop()
+        samples.append((timestamp, value))
+        self.levels[name] = current
+
+    # Drops everything older than the window ending at timestamp
+    def expire(self, timestamp):
+        cutoff = timestamp - self.length
+        entries = self.entries
+        sums = self.sums
+        while entries and entries[0][0] <= cutoff:
+            _, name, value = entries.popleft()
+            sums[name] -= value
+        for samples in self.peaks.values():
+            while samples and samples[0][0] <= cutoff:
+                samples.popleft()
+
+    def value(self, name):
+        samples = self.peaks.get(name)
+        if samples is not None:
+            peak = self.levels[name]
+            if samples and samples[0][1] > peak:
+                peak = samples[0][1]
+            return peak
+        return self.sums.get(name, 0)
+
+    def names(self):
+        return set(name for name, value in self.sums.items()
+                   if round(value, 6)) | \
+               set(self.peaks)
+
+
+# Fires once when a window metric goes over its limit and re-arms when the
+# metric drops back to the limit or below
+class BurstDetector(object):
+
+    def __init__(self, window, metric, limit):
+        self.window = window
+        self.metric = metric
+        self.limit = limit
+        self.active = False
+        self.fired = 0
+        self.peak = 0
+
+    def check(self, timestamp):
+        value = self.window.value(self.metric)
+        if value > self.peak:
+            self.peak = value
+        if value > self.limit:
+            if not self.active:
+                self.active = True
+                self.fired += 1
+                return value
+        else:
+            self.active = False
+        return None
+
+
+# Turns reclaim and compaction tracepoints into window updates
+class ReclaimWindows(object):
+
+    def __init__(self, window_lengths=DEFAULT_WINDOWS):
+        self.windows = [SlidingWindow(length) for length in window_lengths]
+        self.detectors = []
+        self.reclaim_begin = {}
+        self.compaction_begin = {}
+        self.trace_match = symbols.by_tracepoint_id({
+            'mm_vmscan_direct_reclaim_begin':
+                                        self.direct_reclaim_b,
+            'mm_vmscan_direct_reclaim_end':
+                                        self.direct_reclaim_e,
+            'mm_compaction_try_to_compact_pages_begin':
+                                        self.compaction_b,
+            'mm_compaction_try_to_compact_pages_end':
+                                        self.compaction_e,
+            'mm_compaction_zone_end':   self.compaction_zone_e})
+
+    # Returns the window of the given length, adding it if needed
+    def window(self, length_ms):
+        for window in self.windows:
+            if window.length == length_ms:
+                return window
+        window = SlidingWindow(length_ms)
+        self.windows.append(window)
+        return window
+
+    def add_detector(self, length_ms, metric, limit):
+        detector = BurstDetector(self.window(length_ms), metric, limit)
+        self.detectors.append(detector)
+        return detector
+
+    # Feeds one TraceEvent, returns the detectors that fired because of it
+    # as (detector, value) pairs
+    def update(self, event):
+        handler = self.trace_match.get(event.tracepoint)
+        if handler is None:
+            return []
+        timestamp = event.timestamp
+        for window in self.windows:
+            window.expire(timestamp)
+        handler(event)
+        fired = []
+        for detector in self.detectors:
+            value = detector.check(timestamp)
+            if value is not None:
+                fired.append((detector, value))
+        return fired
+
+    def add(self, timestamp, name, value=1):
+        for window in self.windows:
+            window.add(timestamp, name, value)
+
+    def sample(self, timestamp, name, value, current):
+        for window in self.windows:
+            window.sample(timestamp, name, value, current)
+
+    def begin(self, begin_times, level_name, entry_name, event):
+        begin_times[event.task] = event.timestamp
+        level = len(begin_times)
+        self.add(event.timestamp, entry_name)
+        self.sample(event.timestamp, level_name, level, level)
+
+    def end(self, begin_times, level_name, event):
+        begin_time = begin_times.pop(event.task, None)
+        if begin_time is None:
+            return
+        level = len(begin_times)
+        self.add(event.timestamp, 'stall_ms', event.timestamp - begin_time)
+        self.sample(event.timestamp, level_name, level + 1, level)
+
+    def direct_reclaim_b(self, event):
+        self.begin(self.reclaim_begin, 'reclaim_tasks', 'reclaim_entries',
+                   event)
+
+    def direct_reclaim_e(self, event):
+        self.end(self.reclaim_begin, 'reclaim_tasks', event)
+        match_format = tracepoints.direct_reclaim_end_pattern.match(event.info)
+        if match_format:
+            self.add(event.timestamp, 'nr_reclaimed',
+                     int(match_format.group(1)))
+
+    def compaction_b(self, event):
+        self.begin(self.compaction_begin, 'compaction_tasks',
+                   'compaction_entries', event)
+
+    def compaction_e(self, event):
+        self.end(self.compaction_begin, 'compaction_tasks', event)
+        match_format = tracepoints.compact_end_pattern.match(event.info)
+        if match_format:
+            self.add(event.timestamp, 'rc_' + match_format.group(1))
+
+    def compaction_zone_e(self, event):
+        match_format = tracepoints.compact_zone_end_pattern.match(event.info)
+        if match_format:
+            self.add(event.timestamp, 'status_' + match_format.group(6))
+
+
+# Returns (length_ms, metric, limit) for a detector specification
+def parse_detector(spec):
+    matches = detector_pattern.match(spec)
+    if not matches:
+        raise argparse.ArgumentTypeError('invalid burst detector %r, expected '
+                                         'e.g. 1s:reclaim_entries=20' % spec)
+    metric = matches.group(3)
+    if metric not in METRICS and not metric.startswith(METRIC_PREFIXES):
+        raise argparse.ArgumentTypeError('unknown metric %r in burst detector '
+                                         '%r, expected one of %s or rc_/status_'
+                                         '<result>' % (metric, spec,
+                                                       ', '.join(METRICS)))
+    length = float(matches.group(1)) * WINDOW_UNITS[matches.group(2)]
+    return (length, metric, float(matches.group(4)))
+
+
+# Returns a short name for a window length
+def window_name(length_ms):
+    if length_ms % 60000 == 0:
+        return '%dm' % (length_ms // 60000)
+    if length_ms % 1000 == 0:
+        return '%ds' % (length_ms // 1000)
+    return '%gms' % length_ms
+
+
+# Returns the window metrics as a compact key=value string
+def format_window(window):
+    return ' '.join('%s=%g' % (name, round(window.value(name), 3))
+                    for name in sorted(window.names()))
+
+
+def print_burst(detector, value, timestamp):
+    print('%.3f ms : burst in %s window : %s = %g > %g : %s' % (
+          timestamp, window_name(detector.window.length), detector.metric,
+          round(value, 3), detector.limit, format_window(detector.window)))
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Sliding window statistics '
+                                                 'and burst detection for '
+                                                 'direct reclaim and '
+                                                 'compaction')
+    parser.add_argument('-s', '--source', action='append', default=[],
+                        dest='sources',
+                        help='Source to read tracepoints from, may be repeated')
+    parser.add_argument('-b', '--burst', action='append', default=[],
+                        dest='detectors', type=parse_detector,
+                        help='Burst detector WINDOW:METRIC=LIMIT, e.g. '
+                             '1s:reclaim_entries=20 or 1m:stall_ms=5000')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        dest='follow',
+                        help='Keep polling plain files for new data at EOF')
+    args = parser.parse_args()
+
+    sources = args.sources or ['/sys/kernel/debug/tracing/trace_pipe']
+
+    reclaim_windows = ReclaimWindows()
+    for length, metric, limit in args.detectors:
+        reclaim_windows.add_detector(length, metric, limit)
+    last_timestamp = [None]
+
+    def update_windows(source_name, event):
+        last_timestamp[0] = event.timestamp
+        for detector, value in reclaim_windows.update(event):
+            print_burst(detector, value, event.timestamp)
+
+    try:
+        Collector(sources, update_windows, follow=args.follow).run()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        print('Cannot open source file: %s' % e)
+        sys.exit(1)
+
+    if last_timestamp[0] is not None:
+        print('\nwindows at %.3f ms' % last_timestamp[0])
+        for window in reclaim_windows.windows:
+            # Windows are only moved forward by the events they count
+            window.expire(last_timestamp[0])
+            print('%s : %s' % (window_name(window.length),
+                               format_window(window)))
+    for detector in reclaim_windows.detectors:
+        print('%s:%s > %g : fired %d times, peak = %g' % (
+              window_name(detector.window.length), detector.metric,
+              detector.limit, detector.fired, round(detector.peak, 3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Breaks every allocation slowpath (mm_slowpath_begin to mm_slowpath_end) down
+# into the time spent in its components: direct reclaim, slab shrinkers,
+# shrink_list, compaction and the remainder not covered by any tracepoint.
+# Shrinkers and shrink_list run inside direct reclaim, so the direct reclaim
+# figure is the time in direct reclaim outside of them and the components add
+# up to the slowpath time.
+# One line is printed per slow allocation longer than THRESHOLD ms, totals are
+# kept per order and gfp_mask and printed at EOF or when CTRL+C is pressed.
+# Usage: python3 stall_attribution.py -s PATH/TO/TRACE_PIPE -t THRESHOLD
+
+import argparse
+import sys
+
+from collections import defaultdict
+
+import symbols
+import tracepoints
+from trace_collector import Collector
+
+# Constants for components
+DIRECT_RECLAIM          = 0
+SHRINKER                = 1
+SHRINK_LIST             = 2
+COMPACTION              = 3
+OTHER                   = 4
+
+COMPONENT_NAMES = ('reclaim', 'shrinkers', 'shrink_list', 'compaction',
+                   'other')
+
+# Order and gfp_mask of allocations that did not fit into max_classes
+OVERFLOW_CLASS = (-1, 'other')
+
+DEFAULT_MAX_CLASSES = 256
+
+# Begin and end tracepoints of every component. mm_vmscan_shrink_slab_* wraps
+# the whole shrink_slab call and mm_shrink_slab_* every shrinker inside it,
+# components keep a nesting depth and only the outermost interval is timed.
+COMPONENT_TRACEPOINTS = symbols.by_tracepoint_id({
+    'mm_vmscan_direct_reclaim_begin':           (DIRECT_RECLAIM, True),
+    'mm_vmscan_direct_reclaim_end':             (DIRECT_RECLAIM, False),
+    'mm_shrink_slab_start':                     (SHRINKER, True),
+    'mm_shrink_slab_end':                       (SHRINKER, False),
+    'mm_vmscan_shrink_slab_start':              (SHRINKER, True),
+    'mm_vmscan_shrink_slab_end':                (SHRINKER, False),
+    'mm_vmscan_shrink_list_begin':              (SHRINK_LIST, True),
+    'mm_vmscan_shrink_list_end':                (SHRINK_LIST, False),
+    'mm_compaction_try_to_compact_pages_begin': (COMPACTION, True),
+    'mm_compaction_try_to_compact_pages_end':   (COMPACTION, False)})
+
+SLOWPATH_BEGIN = symbols.tracepoints.id('mm_slowpath_begin')
+SLOWPATH_END = symbols.tracepoints.id('mm_slowpath_end')
+
+
+# Slowpath currently running in a task
+class SlowAllocation(object):
+
+    __slots__ = ('begin', 'order', 'gfp_mask', 'component_begin',
+                 'component_depth', 'times')
+
+    def __init__(self, begin, order, gfp_mask):
+        self.begin = begin
+        self.order = order
+        self.gfp_mask = gfp_mask
+        self.component_begin = [None] * OTHER
+        self.component_depth = [0] * OTHER
+        self.times = [0.0] * OTHER
+
+
+# Totals for all slow allocations of one order and gfp_mask
+class ClassStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max_total = 0.0
+        self.times = [0.0] * len(COMPONENT_NAMES)
+
+    def add(self, record):
+        self.count += 1
+        self.total += record['total']
+        if record['total'] > self.max_total:
+            self.max_total = record['total']
+        for component, time in enumerate(record['times']):
+            self.times[component] += time
+
+
+class StallAttribution(object):
+
+    def __init__(self, max_classes=DEFAULT_MAX_CLASSES):
+        self.max_classes = max_classes
+        self.allocations = {}
+        self.classes = defaultdict(ClassStats)
+
+    # Feeds one TraceEvent, returns the record of a finished slow allocation
+    # for mm_slowpath_end and None for anything else
+    def update(self, event):
+        component = COMPONENT_TRACEPOINTS.get(event.tracepoint)
+        if component is not None:
+            allocation = self.allocations.get(event.task)
+            if allocation is not None:
+                self.component_event(allocation, component, event.timestamp)
+            return None
+        if event.tracepoint == SLOWPATH_BEGIN:
+            self.slowpath_b(event)
+        elif event.tracepoint == SLOWPATH_END:
+            return self.slowpath_e(event)
+        return None
+
+    def component_event(self, allocation, component, timestamp):
+        component, is_begin = component
+        depth = allocation.component_depth[component]
+        if is_begin:
+            if not depth:
+                allocation.component_begin[component] = timestamp
+            allocation.component_depth[component] = depth + 1
+            return
+        if not depth:
+            return
+        allocation.component_depth[component] = depth - 1
+        if depth == 1:
+            begin = allocation.component_begin[component]
+            allocation.times[component] += timestamp - begin
+            allocation.component_begin[component] = None
+
+    def slowpath_b(self, event):
+        match_format = tracepoints.slowpath_begin_pattern.match(event.info)
+        if match_format:
+            order = int(match_format.group(2))
+            gfp_mask = match_format.group(1)
+        else:
+            order = -1
+            gfp_mask = ''
+        self.allocations[event.task] = SlowAllocation(event.timestamp, order,
+                                                      gfp_mask)
+
+    def slowpath_e(self, event):
+        allocation = self.allocations.pop(event.task, None)
+        if allocation is None:
+            return None
+        times = allocation.times
+        total = round(event.timestamp - allocation.begin, 3)
+        reclaim = times[DIRECT_RECLAIM] - times[SHRINKER] - times[SHRINK_LIST]
+        components = [max(reclaim, 0.0), times[SHRINKER], times[SHRINK_LIST],
+                      times[COMPACTION]]
+        components.append(max(total - sum(components), 0.0))
+        record = {'task': event.task,
+                  'order': allocation.order,
+                  'gfp_mask': allocation.gfp_mask,
+                  'total': total,
+                  'times': components}
+        self.class_stats(allocation.order, allocation.gfp_mask).add(record)
+        return record
+
+    # Returns the totals for an allocation class, classes beyond max_classes
+    # share one entry so memory stays bounded
+    def class_stats(self, order, gfp_mask):
+        key = (order, gfp_mask)
+        if key not in self.classes and len(self.classes) >= self.max_classes:
+            key = OVERFLOW_CLASS
+        return self.classes[key]
+
+
+def print_record(record):
+    print('%s : slowpath : order = %d gfp_mask = %s : time = %.3f ms : %s' % (
+          symbols.tasks.name(record['task']), record['order'],
+          record['gfp_mask'], record['total'],
+          ' '.join('%s = %.3f' % (name, time)
+                   for name, time in zip(COMPONENT_NAMES, record['times']))))
+
+
+def print_summary(stall_attribution):
+    print('\n%-6s %-40s %7s %10s %10s  %s' % (
+          'order', 'gfp_mask', 'count', 'mean (ms)', 'max (ms)',
+          '  '.join('%11s' % name for name in COMPONENT_NAMES)))
+    for key in sorted(stall_attribution.classes):
+        class_stats = stall_attribution.classes[key]
+        shares = []
+        for time in class_stats.times:
+            if class_stats.total:
+                shares.append('%10.1f%%' % (time * 100 / class_stats.total))
+            else:
+                shares.append('%11s' % '-')
+        print('%-6d %-40s %7d %10.3f %10.3f  %s' % (
+              key[0], key[1], class_stats.count,
+              class_stats.total / class_stats.count, class_stats.max_total,
+              '  '.join(shares)))
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Attributes allocation '
+                                                 'stalls to reclaim and '
+                                                 'compaction')
+    parser.add_argument('-s', '--source', action='append', default=[],
+                        dest='sources',
+                        help='Source to read tracepoints from, may be repeated')
+    parser.add_argument('-t', '--threshold', action='store', default=0.0,
+                        dest='threshold', type=float)
+    parser.add_argument('-c', '--max-classes', action='store', type=int,
+                        default=DEFAULT_MAX_CLASSES, dest='max_classes',
+                        help='Number of order/gfp_mask classes to keep '
+                             'separate totals for')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        dest='follow',
+                        help='Keep polling plain files for new data at EOF')
+    args = parser.parse_args()
+
+    sources = args.sources or ['/sys/kernel/debug/tracing/trace_pipe']
+    threshold = args.threshold
+
+    stall_attribution = StallAttribution(args.max_classes)
+
+    def attribute_stall(source_name, event):
+        record = stall_attribution.update(event)
+        if record and record['total'] > threshold:
+            print_record(record)
+
+    try:
+        Collector(sources, attribute_stall, follow=args.follow).run()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        print('Cannot open source file: %s' % e)
+        sys.exit(1)
+
+    print_summary(stall_attribution)
+
+
+if __name__ == '__main__':
+    main()
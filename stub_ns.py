@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Stand-in for ns when it is not installed. It takes the same arguments as
+# ns MyMac.tcl and writes a synthetic trace in the format analyse_trace.py
+# reads, with the same number of nodes, duration and cbr interval.
+# Every copy of a packet reaches the sink with a probability that drops as
+# more copies are sent, so the delivery ratio has an optimum repeat count
+# like the real simulation.
+# Usage: python3 stub_ns.py MyMac.tcl REPEAT [TRACE_FILE] [SEED]
+
+import math
+import random
+import sys
+
+NODE_NUM        = 101
+DURATION        = 10
+CBR_INTERVAL    = 0.02
+PACKET_SIZE     = 148
+
+# Channel occupancy of one copy relative to the cbr interval
+LOAD_PER_COPY   = 0.002
+
+
+def simulate(repeat, trace_file, seed):
+    rng = random.Random(seed)
+    sources = NODE_NUM - 1
+    # Chance of a copy not colliding with any of the other copies sent
+    # in the same interval
+    success = math.exp(-2 * LOAD_PER_COPY * sources * repeat)
+    packet = 0
+    with open(trace_file, 'w') as f:
+        for interval in range(int(DURATION / CBR_INTERVAL)):
+            for node in range(1, sources + 1):
+                start = interval * CBR_INTERVAL
+                for copy in range(repeat):
+                    time = start + rng.random() * CBR_INTERVAL
+                    f.write('s %.9f _%d_ MAC  --- %d cbr %d [0 0 0 0] '
+                            '------- [%d:0 0:0 32 0]\n' % (
+                            time, node, packet, PACKET_SIZE, node))
+                    if rng.random() < success:
+                        f.write('r %.9f _0_ MAC  --- %d cbr %d [0 0 0 0] '
+                                '------- [%d:0 0:0 32 0]\n' % (
+                                time + 0.001, packet, PACKET_SIZE, node))
+                    else:
+                        f.write('D %.9f _0_ MAC  COL %d cbr %d [0 0 0 0] '
+                                '------- [%d:0 0:0 32 0]\n' % (
+                                time + 0.001, packet, PACKET_SIZE, node))
+                packet += 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or len(sys.argv) > 5:
+        print('Usage: stub_ns.py MyMac.tcl REPEAT [TRACE_FILE] [SEED]')
+        sys.exit(0)
+    repeat = int(sys.argv[2])
+    trace_file = sys.argv[3] if len(sys.argv) > 3 else 'jravicha.tr'
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    simulate(repeat, trace_file, seed)
+    print('END OF SIMULATION. CHECK TRACE FILE FOR RESULTS')
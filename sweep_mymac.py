@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Runs MyMac.tcl for a range of repeat counts and seeds in parallel and shows
+# the delivery ratio of every repeat count with a 95% confidence interval.
+# Every run writes its own trace file, which is streamed through
+# analyse_trace.py by the worker as soon as the simulation finishes.
+# When ns is not installed the synthetic traces of stub_ns.py are used.
+# Usage: python3 sweep_mymac.py -r 1 2 3 4 5 -n 10 [-j JOBS] [-d TRACE_DIR]
+
+import argparse
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import analyse_trace
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Two sided 95% quantiles of the t distribution by degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+        2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101,
+        2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
+        2.048, 2.045, 2.042]
+
+
+# Returns the command line of the simulator, the stub if ns is missing
+def simulator_command(simulator):
+    if simulator == 'stub' or (simulator == 'ns' and not shutil.which('ns')):
+        return [sys.executable, os.path.join(SCRIPT_DIR, 'stub_ns.py')]
+    return simulator.split()
+
+
+# Runs one simulation and returns its delivery statistics. Runs in a worker.
+def run_simulation(command, repeat, seed, trace_file, keep_trace):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(command + [os.path.join(SCRIPT_DIR,
+                                                      'MyMac.tcl'),
+                                         str(repeat), trace_file, str(seed)],
+                              cwd=SCRIPT_DIR, stdout=devnull)
+    try:
+        with open(trace_file, 'r') as f:
+            stats = analyse_trace.delivery_stats(f)
+    finally:
+        if not keep_trace:
+            os.remove(trace_file)
+    return (repeat, seed, stats.total_sent, stats.packets_received,
+            stats.delivery_ratio())
+
+
+# Returns mean and half width of the 95% confidence interval
+def confidence_interval(values):
+    count = len(values)
+    mean = sum(values) / count
+    if count < 2:
+        return (mean, None)
+    variance = sum((value - mean) ** 2 for value in values) / (count - 1)
+    if count - 1 <= len(T_95):
+        t = T_95[count - 2]
+    else:
+        t = 1.96
+    return (mean, t * math.sqrt(variance / count))
+
+
+def print_table(ratios):
+    print('\n%8s %6s %10s %10s %10s %10s' % ('repeat', 'runs', 'ratio',
+                                            '95% CI', 'min', 'max'))
+    best = None
+    for repeat in sorted(ratios):
+        values = ratios[repeat]
+        mean, half_width = confidence_interval(values)
+        if best is None or mean > best[1]:
+            best = (repeat, mean)
+        print('%8d %6d %9.2f%% %10s %9.2f%% %9.2f%%' % (
+              repeat, len(values), mean * 100,
+              '-' if half_width is None else '+-%.2f%%' % (half_width * 100),
+              min(values) * 100, max(values) * 100))
+    if best:
+        print('\nbest repeat count: %d (%.2f%%)' % (best[0], best[1] * 100))
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Parameter sweep for '
+                                                 'MyMac.tcl')
+    parser.add_argument('-r', '--repeats', action='store', nargs='+',
+                        type=int, default=[1, 2, 3, 4, 5], dest='repeats',
+                        help='Repeat counts to simulate')
+    parser.add_argument('-n', '--seeds', action='store', type=int, default=5,
+                        dest='seeds', help='Number of seeds per repeat count')
+    parser.add_argument('-j', '--jobs', action='store', type=int,
+                        default=os.cpu_count(), dest='jobs',
+                        help='Number of simulations to run at the same time')
+    parser.add_argument('-s', '--simulator', action='store', default='ns',
+                        dest='simulator',
+                        help='Simulator command, "stub" for stub_ns.py')
+    parser.add_argument('-d', '--trace-dir', action='store', default=None,
+                        dest='trace_dir',
+                        help='Keep the trace files in this directory')
+    args = parser.parse_args()
+
+    command = simulator_command(args.simulator)
+    # Simulations run in SCRIPT_DIR, so relative paths would point there
+    trace_dir = os.path.abspath(args.trace_dir or
+                                tempfile.mkdtemp(prefix='mymac-sweep-'))
+    keep_traces = args.trace_dir is not None
+    if keep_traces and not os.path.isdir(trace_dir):
+        os.makedirs(trace_dir)
+
+    ratios = defaultdict(list)
+    failed = 0
+    try:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            runs = {}
+            for repeat in args.repeats:
+                for seed in range(1, args.seeds + 1):
+                    trace_file = os.path.join(trace_dir, 'repeat%d-seed%d.tr'
+                                              % (repeat, seed))
+                    run = executor.submit(run_simulation, command, repeat,
+                                          seed, trace_file, keep_traces)
+                    runs[run] = (repeat, seed)
+            for run in as_completed(runs):
+                try:
+                    repeat, seed, total_sent, packets_received, ratio = \
+                        run.result()
+                except Exception as e:
+                    # A run whose simulator failed or whose trace could
+                    # not be parsed is left out of the table
+                    failed += 1
+                    print('repeat %d seed %d : failed: %s' % (runs[run] +
+                                                              (e,)))
+                    continue
+                ratios[repeat].append(ratio)
+                print('repeat %d seed %d : total sent: %d, no of packets '
+                      'received by sink: %d, Percentage: %.2f%%' % (
+                      repeat, seed, total_sent, packets_received,
+                      ratio * 100))
+    finally:
+        if not keep_traces:
+            shutil.rmtree(trace_dir, ignore_errors=True)
+
+    print_table(ratios)
+    if failed:
+        print('%d of %d runs failed' % (failed, len(runs)))
+
+
+if __name__ == '__main__':
+    main()
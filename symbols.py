@@ -0,0 +1,100 @@
+# Symbol tables mapping the strings that repeat in every event to small
+# integer ids. Task names (comm-pid), comms, shrinker functions and
+# tracepoint names are interned once at parse time. State, aggregates and
+# exports then use the ids, and names are only resolved back for reporting.
+
+import re
+
+from collections import OrderedDict
+
+# Task ids kept before the least recently seen task's id is reused, above
+# the default pid_max so normally only exited tasks are recycled
+DEFAULT_MAX_TASKS = 65536
+
+# Regex for the shrinker function at the start of mm_shrink_slab_* info,
+# e.g. super_cache_scan+0x0/0x1a0
+shrinker_pattern = re.compile(r'\s*(\w+)\+')
+
+
+class SymbolTable(object):
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    # Returns the id of name, adding it if needed
+    def id(self, name):
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol_id
+
+    def name(self, symbol_id):
+        return self.names[symbol_id]
+
+    def __len__(self):
+        return len(self.names)
+
+
+# Tasks as they appear in trace_pipe (comm-pid). The comm id and pid of a
+# task are split out once when the task is first seen.
+# Pids churn on busy machines, so once max_tasks tasks are known the id of
+# the least recently seen one is given to the next new task. Names of ids
+# must be resolved while the task is active, state kept under the id of a
+# task that has not been seen for max_tasks other tasks is stale.
+class TaskTable(SymbolTable):
+
+    def __init__(self, comm_table, max_tasks=DEFAULT_MAX_TASKS):
+        SymbolTable.__init__(self)
+        self.ids = OrderedDict()
+        self.comm_table = comm_table
+        self.max_tasks = max_tasks
+        self.comms = []
+        self.pids = []
+
+    def id(self, name):
+        symbol_id = self.ids.get(name)
+        if symbol_id is not None:
+            self.ids.move_to_end(name)
+            return symbol_id
+        comm, _, pid = name.rpartition('-')
+        if not comm or not pid.isdigit():
+            comm, pid = name, '-1'
+        if len(self.names) < self.max_tasks:
+            symbol_id = SymbolTable.id(self, name)
+            self.comms.append(self.comm_table.id(comm))
+            self.pids.append(int(pid))
+            return symbol_id
+        _, symbol_id = self.ids.popitem(last=False)
+        self.ids[name] = symbol_id
+        self.names[symbol_id] = name
+        self.comms[symbol_id] = self.comm_table.id(comm)
+        self.pids[symbol_id] = int(pid)
+        return symbol_id
+
+    def comm(self, symbol_id):
+        return self.comms[symbol_id]
+
+    def pid(self, symbol_id):
+        return self.pids[symbol_id]
+
+
+comms = SymbolTable()
+tasks = TaskTable(comms)
+shrinkers = SymbolTable()
+tracepoints = SymbolTable()
+
+
+# Returns the id of the shrinker in mm_shrink_slab_* info or None
+def shrinker_id(trace_info):
+    matches = shrinker_pattern.match(trace_info)
+    if not matches:
+        return None
+    return shrinkers.id(matches.group(1))
+
+
+# Returns a dictionary keyed by tracepoint ids for one keyed by names
+def by_tracepoint_id(by_name):
+    return dict((tracepoints.id(name), value)
+                for name, value in by_name.items())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Runs the Collector against local files, a gzip capture and a FIFO.
+# Usage: python3 -m pytest test_trace_collector.py
+
+import asyncio
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from trace_collector import Collector
+
+LINE = ('         cc1-%d     [000] d..1  100.%06d: '
+        'mm_vmscan_direct_reclaim_begin: order=0 may_writepage=1 '
+        'gfp_flags=GFP_KERNEL\n')
+
+# Seconds after which a test collection counts as hung
+TIMEOUT = 10
+
+
+def trace_lines(count):
+    return ''.join(LINE % (index, index) for index in range(count)).encode()
+
+
+# Writes data to a FIFO like a relay that first connects and hangs up
+# without writing
+def relay(path, data):
+    with open(path, 'wb'):
+        pass
+    time.sleep(0.3)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class CollectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def collect(self, collector):
+        return asyncio.run(asyncio.wait_for(collector.collect(), TIMEOUT))
+
+    def test_sources(self):
+        with open(self.path('plain.txt'), 'wb') as f:
+            f.write(trace_lines(10) + b'not a tracepoint\n')
+        with gzip.open(self.path('capture.txt.gz'), 'wb') as f:
+            f.write(trace_lines(20))
+        os.mkfifo(self.path('fifo'))
+        writer = threading.Thread(target=relay,
+                                  args=(self.path('fifo'), trace_lines(30)))
+        writer.start()
+
+        events = {}
+
+        def count_event(source_name, event):
+            events[source_name] = events.get(source_name, 0) + 1
+
+        sources = [self.path('plain.txt'), self.path('capture.txt.gz'),
+                   self.path('fifo')]
+        collector = Collector(sources, count_event, queue_size=1,
+                              poll_interval=0.01)
+        try:
+            stats = self.collect(collector)
+        finally:
+            writer.join()
+
+        self.assertEqual(events, dict(zip(sources, (10, 20, 30))))
+        self.assertEqual([source_stats.events for source_stats in stats],
+                         [10, 20, 30])
+        self.assertEqual(stats[0].lines, 11)
+        self.assertTrue(all(source_stats.done for source_stats in stats))
+
+    def test_handler_error(self):
+        with open(self.path('plain.txt'), 'wb') as f:
+            f.write(trace_lines(1000))
+
+        def fail(source_name, event):
+            raise RuntimeError('handler failed')
+
+        collector = Collector([self.path('plain.txt')], fail, queue_size=1)
+        with self.assertRaises(RuntimeError):
+            self.collect(collector)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# Reads tracepoint output from several sources at the same time and feeds
+# every parsed event into one shared handler.
+# Sources can be trace_pipe, the trace_pipe of tracefs instances under
+# instances/, FIFOs written by remote relays or saved captures, which may be
+# gzip, xz, bzip2 or zstd compressed.
+# Each source is read with non-blocking I/O by its own task and parsed events
+# are passed in batches through a bounded queue, so a slow consumer makes
+# the readers wait instead of buffering without limit.
+# Usage: python3 trace_collector.py -s SOURCE [-s SOURCE ...]
+#                                   [-i /sys/kernel/debug/tracing]
+#                                   [-o OUTPUT.gz]
+# Per-source statistics are printed when CTRL+C is pressed.
+
+import argparse
+import asyncio
+import os
+import stat
+import sys
+import time
+
+from collections import defaultdict
+
+import compressed_io
+import symbols
+import tracepoints
+
+READ_SIZE = 65536
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_POLL_INTERVAL = 0.1
+
+
+# Counters kept for every source
+class SourceStats(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes_read = 0
+        self.lines = 0
+        self.events = 0
+        self.batches = 0
+        self.blocked = 0
+        self.last_timestamp = None
+        self.queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.done = False
+
+
+# Returns the trace_pipe of the top level buffer and of every instance
+def tracefs_pipes(tracefs_path):
+    pipes = [os.path.join(tracefs_path, 'trace_pipe')]
+    instances = os.path.join(tracefs_path, 'instances')
+    if os.path.isdir(instances):
+        for name in sorted(os.listdir(instances)):
+            pipe = os.path.join(instances, name, 'trace_pipe')
+            if os.path.exists(pipe):
+                pipes.append(pipe)
+    return pipes
+
+
+class Collector(object):
+
+    # handler is called as handler(source_name, event) for every event.
+    # With follow set, regular files are polled for new data at EOF like
+    # tail -f, otherwise a source is finished when EOF is reached.
+    # Tracepoint lines are also written to record if it is given.
+    def __init__(self, sources, handler, queue_size=DEFAULT_QUEUE_SIZE,
+                 follow=False, poll_interval=DEFAULT_POLL_INTERVAL,
+                 record=None):
+        self.sources = list(sources)
+        self.handler = handler
+        self.queue_size = queue_size
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.record = record
+        self.stats = [SourceStats(source) for source in self.sources]
+        self.newest_timestamp = None
+        self.queue = None
+
+    # Trace time in ms by which a source is behind the newest event seen
+    def lag(self, index):
+        last_timestamp = self.stats[index].last_timestamp
+        if last_timestamp is None or self.newest_timestamp is None:
+            return None
+        return round(self.newest_timestamp - last_timestamp, 3)
+
+    def run(self):
+        return asyncio.run(self.collect())
+
+    async def collect(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        readers = [asyncio.ensure_future(self.read_source(index))
+                   for index in range(len(self.sources))]
+        consumer = asyncio.ensure_future(self.consume())
+        try:
+            await self.unless_consumer_fails(asyncio.gather(*readers),
+                                             consumer)
+            await self.unless_consumer_fails(self.queue.join(), consumer)
+        finally:
+            consumer.cancel()
+            for reader in readers:
+                reader.cancel()
+        return self.stats
+
+    # Waits for awaitable. consume() only ends if the handler raised, that
+    # exception is raised here instead of waiting forever for the queue.
+    async def unless_consumer_fails(self, awaitable, consumer):
+        future = asyncio.ensure_future(awaitable)
+        await asyncio.wait([future, consumer],
+                           return_when=asyncio.FIRST_COMPLETED)
+        if consumer.done():
+            future.cancel()
+            await asyncio.gather(future, return_exceptions=True)
+            consumer.result()
+        return future.result()
+
+    async def consume(self):
+        while True:
+            index, events, queued_at = await self.queue.get()
+            source_stats = self.stats[index]
+            delay = time.monotonic() - queued_at
+            source_stats.queue_delay += delay
+            if delay > source_stats.max_queue_delay:
+                source_stats.max_queue_delay = delay
+            name = source_stats.name
+            try:
+                for event in events:
+                    self.handler(name, event)
+            finally:
+                self.queue.task_done()
+
+    async def put_batch(self, index, events):
+        source_stats = self.stats[index]
+        source_stats.events += len(events)
+        source_stats.batches += 1
+        source_stats.last_timestamp = events[-1].timestamp
+        if (self.newest_timestamp is None or
+                source_stats.last_timestamp > self.newest_timestamp):
+            self.newest_timestamp = source_stats.last_timestamp
+        if self.queue.full():
+            source_stats.blocked += 1
+        await self.queue.put((index, events, time.monotonic()))
+
+    async def read_source(self, index):
+        source_stats = self.stats[index]
+        path = self.sources[index]
+        if compressed_io.file_compression(path):
+            # Compressed captures are decompressed on a background thread
+            with compressed_io.open_capture(path) as reader:
+                await self.read_chunks(index, self.reader_chunks(reader))
+            source_stats.done = True
+            return
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            is_fifo = stat.S_ISFIFO(os.fstat(fd).st_mode)
+            await self.read_chunks(index, self.fd_chunks(fd, is_fifo,
+                                                         source_stats))
+        finally:
+            os.close(fd)
+            source_stats.done = True
+
+    async def read_chunks(self, index, chunks):
+        source_stats = self.stats[index]
+        partial = b''
+        async for chunk in chunks:
+            source_stats.bytes_read += len(chunk)
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            await self.parse_lines(index, lines)
+        if partial:
+            await self.parse_lines(index, [partial])
+
+    async def parse_lines(self, index, lines):
+        self.stats[index].lines += len(lines)
+        events = []
+        record = self.record
+        for line in lines:
+            event = tracepoints.parse_tracepoint(
+                line.decode('utf-8', 'replace'))
+            if event:
+                events.append(event)
+                if record is not None:
+                    record.write(line + b'\n')
+        if events:
+            await self.put_batch(index, events)
+
+    # Yields chunks read from a non-blocking descriptor
+    async def fd_chunks(self, fd, is_fifo, source_stats):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                chunk = os.read(fd, READ_SIZE)
+            except BlockingIOError:
+                # trace_pipe and FIFOs with a writer but no data
+                if not await self.wait_readable(loop, fd):
+                    await asyncio.sleep(self.poll_interval)
+                continue
+            if chunk:
+                yield chunk
+                continue
+            if is_fifo and not source_stats.bytes_read:
+                # No relay has written to the FIFO yet. A relay that
+                # connected and went away leaves the FIFO in hangup, which
+                # polls as readable forever, so poll by sleeping instead.
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if not self.follow:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    # Yields blocks from a compressed capture without blocking the loop
+    async def reader_chunks(self, reader):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(None, reader.read_block)
+            if not chunk:
+                return
+            yield chunk
+
+    # Waits until fd is readable, returns False if fd can not be polled
+    async def wait_readable(self, loop, fd):
+        ready = loop.create_future()
+
+        def set_ready():
+            if not ready.done():
+                ready.set_result(True)
+
+        try:
+            loop.add_reader(fd, set_ready)
+        except PermissionError:
+            return False
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return True
+
+
+# Prints the per-source statistics
+def print_source_stats(collector):
+    print('\n%-40s %10s %10s %8s %10s %12s' % ('source', 'events', 'MB',
+                                               'blocked', 'lag (ms)',
+                                               'max wait (ms)'))
+    for index, source_stats in enumerate(collector.stats):
+        lag = collector.lag(index)
+        print('%-40s %10d %10.2f %8d %10s %12.3f' % (
+              source_stats.name, source_stats.events,
+              source_stats.bytes_read / 1048576.0, source_stats.blocked,
+              '-' if lag is None else lag,
+              source_stats.max_queue_delay * 1000))
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Multi-source tracepoint '
+                                                 'collector')
+    parser.add_argument('-s', '--source', action='append', default=[],
+                        dest='sources',
+                        help='Source to read tracepoints from, may be repeated')
+    parser.add_argument('-i', '--instances', action='store', default=None,
+                        dest='tracefs_path',
+                        help='Read trace_pipe of a tracefs directory and of '
+                             'all of its instances')
+    parser.add_argument('-q', '--queue-size', action='store', type=int,
+                        default=DEFAULT_QUEUE_SIZE, dest='queue_size',
+                        help='Maximum number of batches waiting to be parsed')
+    parser.add_argument('-f', '--follow', action='store_true',
+                        dest='follow',
+                        help='Keep polling plain files for new data at EOF')
+    parser.add_argument('-o', '--output', action='store', default=None,
+                        dest='output_file',
+                        help='Record tracepoint lines to a file, compressed '
+                             'if it ends in .gz, .xz, .bz2 or .zst')
+    args = parser.parse_args()
+
+    sources = list(args.sources)
+    if args.tracefs_path:
+        sources.extend(tracefs_pipes(args.tracefs_path))
+    if not sources:
+        sources = ['/sys/kernel/debug/tracing/trace_pipe']
+
+    tracepoint_counts = defaultdict(int)
+
+    def count_tracepoint(source_name, event):
+        tracepoint_counts[event.tracepoint] += 1
+
+    collector = Collector(sources, count_tracepoint,
+                          queue_size=args.queue_size, follow=args.follow)
+    try:
+        if args.output_file:
+            collector.record = compressed_io.open_output(args.output_file)
+        collector.run()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        if args.output_file and collector.record is None:
+            print('Cannot open output file: %s' % e)
+        else:
+            print('Cannot open source file: %s' % e)
+        sys.exit(1)
+    finally:
+        if collector.record is not None:
+            collector.record.close()
+
+    for name, count in sorted((symbols.tracepoints.name(tracepoint), count)
+                              for tracepoint, count in
+                              tracepoint_counts.items()):
+        print('%s : %d' % (name, count))
+    print_source_stats(collector)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# Sets up tracefs so that the kernel drops uninteresting events before they
+# are formatted and read through trace_pipe, instead of the analyzers
+# filtering them after parsing.
+# Enables the events of interest and writes events/*/*/filter expressions for
+# a minimum allocation order, task names and shrinker names, and
+# set_event_pid for PIDs. Everything written is restored when done.
+# Usage: sudo python3 tracefs_filters.py [-e EVENT ...] [-p PID ...]
+#                                        [-c COMM ...] [-o MIN_ORDER]
+#                                        [-k SHRINKER ...] [-m SECONDS]
+# The filters stay in place until CTRL+C is pressed. With -m the event rate
+# with and without the filters is measured over SECONDS each and reported.
+# The minimum order only filters events with an order field. End events and
+# mm_compaction_zone_* have none and still pass, so the reduction reported by
+# -m is what all filters together achieve, not what -o alone removes.
+
+import argparse
+import os
+import re
+import signal
+import sys
+import time
+
+DEFAULT_TRACEFS = '/sys/kernel/debug/tracing'
+
+# Events read by the analyzers in this repository
+DEFAULT_EVENTS = [
+    'mm_slowpath_begin',
+    'mm_slowpath_end',
+    'mm_vmscan_direct_reclaim_begin',
+    'mm_vmscan_direct_reclaim_end',
+    'mm_vmscan_shrink_zones_begin',
+    'mm_vmscan_shrink_zones_end',
+    'mm_vmscan_softlimit_reclaim_start',
+    'mm_vmscan_softlimit_reclaim_end',
+    'mm_vmscan_shrink_zone_begin',
+    'mm_vmscan_shrink_zone_end',
+    'mm_vmscan_shrink_zone_memcg_begin',
+    'mm_vmscan_shrink_zone_memcg_end',
+    'mm_vmscan_shrink_list_begin',
+    'mm_vmscan_shrink_list_end',
+    'mm_vmscan_shrink_slab_caches_begin',
+    'mm_vmscan_shrink_slab_caches_end',
+    'mm_vmscan_shrink_slab_start',
+    'mm_vmscan_shrink_slab_end',
+    'mm_shrink_slab_start',
+    'mm_shrink_slab_end',
+    'mm_compaction_try_to_compact_pages_begin',
+    'mm_compaction_try_to_compact_pages_end',
+    'mm_compaction_zone_begin',
+    'mm_compaction_zone_end']
+
+# Events that carry the shrinker function in their shrink field
+SHRINKER_EVENTS = ('mm_shrink_slab_start', 'mm_shrink_slab_end')
+
+# Regexes for the format file of an event and the per_cpu stats files
+field_pattern = re.compile(r'\s*field:.*?(\w+)(\[.*\])?;\s*offset:')
+stats_pattern = re.compile(r'^(entries|overrun|read events):\s*(\d+)', re.M)
+
+
+# Reads a tracefs file, returns None if it does not exist
+def read_file(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def write_file(path, value):
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+# Returns the events directory of an event given as NAME or SYSTEM:NAME
+def find_event(tracefs_path, event):
+    events_path = os.path.join(tracefs_path, 'events')
+    if ':' in event:
+        system, name = event.split(':', 1)
+        path = os.path.join(events_path, system, name)
+        return path if os.path.isdir(path) else None
+    for system in sorted(os.listdir(events_path)):
+        path = os.path.join(events_path, system, event)
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+# Returns the names of the fields of an event from its format file
+def event_fields(event_path):
+    fields = set()
+    event_format = read_file(os.path.join(event_path, 'format'))
+    if event_format:
+        for line in event_format.split('\n'):
+            match_format = field_pattern.match(line)
+            if match_format:
+                fields.add(match_format.group(1))
+    return fields
+
+
+# Returns the filter expression for an event or None if nothing is filtered
+def build_filter(event, fields, comms=(), min_order=None, shrinkers=()):
+    parts = []
+    if min_order is not None and 'order' in fields:
+        parts.append('order >= %d' % min_order)
+    if comms:
+        parts.append('(%s)' % ' || '.join('comm == "%s"' % comm
+                                          for comm in comms))
+    if shrinkers and event.split(':')[-1] in SHRINKER_EVENTS and \
+            'shrink' in fields:
+        parts.append('(%s)' % ' || '.join('shrink.function == %s' % shrinker
+                                          for shrinker in shrinkers))
+    if not parts:
+        return None
+    return ' && '.join(parts)
+
+
+# Returns the number of events written to the ring buffer on all cpus
+def events_written(tracefs_path):
+    total = 0
+    per_cpu = os.path.join(tracefs_path, 'per_cpu')
+    if not os.path.isdir(per_cpu):
+        return None
+    for cpu in os.listdir(per_cpu):
+        stats = read_file(os.path.join(per_cpu, cpu, 'stats'))
+        if stats:
+            for match_format in stats_pattern.finditer(stats):
+                total += int(match_format.group(2))
+    return total
+
+
+# Returns the events per second written to the ring buffer over seconds
+def event_rate(tracefs_path, seconds):
+    begin = events_written(tracefs_path)
+    if begin is None:
+        return None
+    time.sleep(seconds)
+    return (events_written(tracefs_path) - begin) / float(seconds)
+
+
+class KernelFilters(object):
+
+    def __init__(self, tracefs_path=DEFAULT_TRACEFS, events=DEFAULT_EVENTS,
+                 pids=(), comms=(), min_order=None, shrinkers=()):
+        self.tracefs_path = tracefs_path
+        self.events = list(events)
+        self.pids = list(pids)
+        self.comms = list(comms)
+        self.min_order = min_order
+        self.shrinkers = list(shrinkers)
+        # Original contents of every file written, restored in reverse order
+        self.saved = []
+        self.missing = []
+        # Events the minimum order can not be applied to
+        self.no_order = []
+
+    def save_and_write(self, path, value):
+        original = read_file(path)
+        if original is None:
+            raise IOError('%s does not exist' % path)
+        self.saved.append((path, original))
+        write_file(path, value)
+
+    # Enables the events of interest, with filters if with_filters is set.
+    # Returns a dictionary of filter expressions by event path.
+    def apply(self, with_filters=True):
+        filters = {}
+        self.missing = []
+        self.no_order = []
+        for event in self.events:
+            event_path = find_event(self.tracefs_path, event)
+            if event_path is None:
+                self.missing.append(event)
+                continue
+            if with_filters:
+                fields = event_fields(event_path)
+                if self.min_order is not None and 'order' not in fields:
+                    self.no_order.append(event)
+                event_filter = build_filter(event, fields, self.comms,
+                                            self.min_order, self.shrinkers)
+                if event_filter:
+                    self.save_and_write(os.path.join(event_path, 'filter'),
+                                        event_filter)
+                    filters[event_path] = event_filter
+            self.save_and_write(os.path.join(event_path, 'enable'), '1')
+        if with_filters and self.pids:
+            self.save_and_write(os.path.join(self.tracefs_path,
+                                             'set_event_pid'),
+                                ' '.join(str(pid) for pid in self.pids))
+        return filters
+
+    # Puts back everything apply() changed
+    def restore(self):
+        while self.saved:
+            path, original = self.saved.pop()
+            original = original.strip()
+            if path.endswith('filter') and original == 'none':
+                original = '0'
+            write_file(path, original)
+
+    def __enter__(self):
+        self.apply()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.restore()
+
+
+def print_filters(kernel_filters, filters):
+    for event_path in sorted(filters):
+        print('%s : %s' % (os.path.basename(event_path), filters[event_path]))
+    if kernel_filters.pids:
+        print('set_event_pid : %s' % ' '.join(str(pid)
+                                              for pid in kernel_filters.pids))
+    for event in kernel_filters.missing:
+        print('%s : not available' % event)
+    for event in kernel_filters.no_order:
+        print('%s : no order field, not filtered by minimum order' % event)
+
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Kernel side event filters')
+    parser.add_argument('-d', '--tracefs', action='store',
+                        default=DEFAULT_TRACEFS, dest='tracefs_path',
+                        help='Path of the tracing directory')
+    parser.add_argument('-e', '--event', action='append', default=[],
+                        dest='events',
+                        help='Event to enable as NAME or SYSTEM:NAME, may be '
+                             'repeated, defaults to the events the analyzers '
+                             'read')
+    parser.add_argument('-p', '--pid', action='append', default=[],
+                        dest='pids', type=int,
+                        help='Only trace this PID, may be repeated')
+    parser.add_argument('-c', '--comm', action='append', default=[],
+                        dest='comms',
+                        help='Only trace tasks with this name, may be repeated')
+    parser.add_argument('-o', '--min-order', action='store', default=None,
+                        dest='min_order', type=int,
+                        help='Drop events of allocations below this order')
+    parser.add_argument('-k', '--shrinker', action='append', default=[],
+                        dest='shrinkers',
+                        help='Only trace this shrinker function, may be '
+                             'repeated')
+    parser.add_argument('-m', '--measure', action='store', default=None,
+                        dest='measure', type=float,
+                        help='Measure the event rate with and without filters '
+                             'over this many seconds each')
+    args = parser.parse_args()
+
+    kernel_filters = KernelFilters(args.tracefs_path,
+                                   args.events or DEFAULT_EVENTS, args.pids,
+                                   args.comms, args.min_order, args.shrinkers)
+
+    # Make sure the filters are removed when we are killed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        if args.measure:
+            kernel_filters.apply(with_filters=False)
+            unfiltered_rate = event_rate(args.tracefs_path, args.measure)
+            kernel_filters.restore()
+            print_filters(kernel_filters, kernel_filters.apply())
+            filtered_rate = event_rate(args.tracefs_path, args.measure)
+            if unfiltered_rate is None or filtered_rate is None:
+                print('\nper_cpu stats not available, cannot measure rate')
+            else:
+                print('\nevents/s without filters = %.1f with filters = %.1f'
+                      % (unfiltered_rate, filtered_rate))
+                if unfiltered_rate:
+                    print('reduction = %.1f%%' % (
+                          (1 - filtered_rate / unfiltered_rate) * 100))
+                if kernel_filters.no_order:
+                    print('%d events without an order field are not filtered '
+                          'by minimum order' % len(kernel_filters.no_order))
+        else:
+            print_filters(kernel_filters, kernel_filters.apply())
+        print('\nfilters are active, press CTRL+C to remove them')
+        signal.pause()
+    except KeyboardInterrupt:
+        pass
+    except IOError as e:
+        print('Cannot set up tracefs: %s' % e)
+        sys.exit(1)
+    finally:
+        kernel_filters.restore()
+
+
+if __name__ == '__main__':
+    main()
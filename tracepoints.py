@@ -0,0 +1,68 @@
+# Shared parsing helpers for trace_pipe style tracepoint output.
+# A line looks like:
+#   kswapd0-52    [001] d..1  1234.567890: mm_vmscan_direct_reclaim_begin: order=0 ...
+
+import re
+from collections import namedtuple
+
+import symbols
+
+# Regex for tracepoints, same layout as in analyse_latencies.py
+tracepoint_pattern = re.compile(r'\s*([\w-]+)\s+\[(\d+)\]\s+(.*)\s+(\d+\.\d+):'
+                                r'\s+(\w+):\s+(.*)')
+
+# Regexes for trace information, same as in analyse_latencies.py
+slowpath_begin_pattern = re.compile(r'gfp_mask:(\w*) order=(\d*)')
+direct_reclaim_begin_pattern = re.compile(r'order=(\d*) may_writepage=([01]) '
+                                          r'gfp_flags=(\w*)')
+direct_reclaim_end_pattern = re.compile(r'nr_reclaimed=(\d*)')
+compact_begin_pattern = re.compile(r'order=(\d*) gfp_mask=(\w*) mode=(\d*)')
+compact_end_pattern = re.compile(r'rc=(\w*) contended=(\d*)')
+compact_zone_begin_pattern = re.compile(r'nid=(\d*) zid=(\d*) '
+                                        r'zone_start=(\w*) migrate_pfn=(\w*) '
+                                        r'free_pfn=(\w*) zone_end=(\w*) '
+                                        r'mode=(\w*)')
+compact_zone_end_pattern = re.compile(r'zone_start=(\w*) migrate_pfn=(\w*) '
+                                      r'free_pfn=(\w*) zone_end=(\w*), '
+                                      r'mode=(\w*) status=(\w*)')
+shrink_slab_begin_pattern = re.compile(r'\s*(\w+)\+\S* (\w+): nid: (\d+) '
+                                       r'objects to shrink (-?\d+) '
+                                       r'gfp_flags (\S+) pgs_scanned (\d+) '
+                                       r'lru_pgs (\d+) cache items (-?\d+) '
+                                       r'delta (-?\d+) total_scan (-?\d+)')
+shrink_slab_end_pattern = re.compile(r'\s*(\w+)\+\S* (\w+): nid: (\d+) '
+                                     r'unused scan count (-?\d+) '
+                                     r'new scan count (-?\d+) '
+                                     r'total_scan (-?\d+) '
+                                     r'last shrinker return val (-?\d+)')
+
+# One parsed tracepoint line. task, tracepoint and, for mm_shrink_slab_*
+# events, shrinker are ids from the symbol tables in symbols.py, timestamp is
+# in milliseconds. shrinker is None for every other event.
+TraceEvent = namedtuple('TraceEvent',
+                        'task cpu timestamp tracepoint info shrinker')
+
+# Tracepoints whose info starts with the shrinker function
+SHRINKER_TRACEPOINTS = (symbols.tracepoints.id('mm_shrink_slab_start'),
+                        symbols.tracepoints.id('mm_shrink_slab_end'))
+
+
+# Converts raw string time to milliseconds
+def convert_time(raw_time):
+    time_components = raw_time.split('.')
+    return float(time_components[0])*1000 + float(time_components[1])/1000
+
+
+# Returns a TraceEvent for a tracepoint line or None for anything else
+def parse_tracepoint(line):
+    matches = tracepoint_pattern.match(line)
+    if not matches:
+        return None
+    tracepoint = symbols.tracepoints.id(matches.group(5))
+    info = matches.group(6)
+    shrinker = None
+    if tracepoint in SHRINKER_TRACEPOINTS:
+        shrinker = symbols.shrinker_id(info)
+    return TraceEvent(symbols.tasks.id(matches.group(1)),
+                      int(matches.group(2)), convert_time(matches.group(4)),
+                      tracepoint, info, shrinker)